@@ -8,97 +8,505 @@ Usage examples:
 Notes:
  - Requires `gsutil` on PATH and authenticated gcloud account for the target bucket.
  - Saves downloads under ./downloads
+ - Downloads run concurrently (see --concurrency) over a single aiohttp session.
 """
 import argparse
+import asyncio
+import json
+import os
+import random
+import re
 import shutil
 import subprocess
 import sys
 import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 from urllib.parse import urljoin
 
-import requests
-from bs4 import BeautifulSoup
+import aiohttp
+from bs4 import BeautifulSoup, SoupStrainer
 
 BASE_URL = "http://data.gdeltproject.org/events/index.html"
+# href="..." attributes whose value contains "export" (any case)
+_LINK_RE = re.compile(rb'href="([^"]*export[^"]*)"', re.IGNORECASE)
+# Default number of downloads kept in flight at once; higher values risk rate
+# limiting and pegging the event loop thread on TLS decryption.
+CONCURRENCY = 16
+# Buffer size for streaming copies (downloads, zip extraction, uploads); large
+# enough that syscall overhead stops mattering on fast links and disks
+CHUNK_SIZE = 1 << 20
+# Sidecar in the downloads directory holding ETag/Last-Modified per URL whose files were uploaded
+META_FILE = ".meta.json"
+# Cached index page link list plus the validators to revalidate it with
+INDEX_CACHE_FILE = ".index_cache.json"
+# Files per `gsutil -m cp` invocation; keeps the command line well under OS limits
+UPLOAD_BATCH_SIZE = 100
+# Send a partial upload batch once its first item has waited this many seconds
+UPLOAD_MAX_WAIT = 10
+# Upload batches running at once; later batches wait for a free slot
+UPLOADS_IN_FLIGHT = 2
+# Capacity of the queues between the download, extract and upload stages
+QUEUE_SIZE = 4
+# gsutil uploads files larger than this as parallel composite objects
+COMPOSITE_UPLOAD_THRESHOLD = "150M"
+# Seconds an idle pooled connection is kept open for reuse
+KEEPALIVE_TIMEOUT = 60
+# Transient failures are retried RETRIES times, sleeping RETRY_BACKOFF * 2**attempt
+# seconds times a random 1-2x jitter (or longer if the server sends Retry-After)
+RETRIES = 5
+RETRY_BACKOFF = 0.5
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+DOWNLOAD_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=60, sock_read=60)
 
 
-def list_export_links(session):
-	resp = session.get(BASE_URL, timeout=30)
-	resp.raise_for_status()
-	soup = BeautifulSoup(resp.text, "html.parser")
-	links = []
-	for a in soup.find_all("a", href=True):
-		href = a["href"]
-		if "export" in href.lower():
-			full = urljoin(BASE_URL, href)
-			links.append(full)
+def load_json(path: Path):
+	"""Return the JSON object saved at path by an earlier run, or {} if there is none."""
+	try:
+		return json.loads(path.read_text())
+	except (OSError, ValueError):
+		return {}
+
+
+def save_json(path: Path, data):
+	# Write to a temp file and swap it in so an interrupted run never leaves a torn file
+	tmp = path.with_name(path.name + ".tmp")
+	tmp.write_text(json.dumps(data, indent=1, sort_keys=True))
+	tmp.replace(path)
+
+
+def response_validators(headers):
+	return {"etag": headers.get("ETag"), "last_modified": headers.get("Last-Modified")}
+
+
+async def list_export_links(session, parse_html=False, cache_dir=None):
+	"""Return the export links on the index page.
+
+	With cache_dir, the link list is cached in INDEX_CACHE_FILE together with the
+	page's ETag/Last-Modified, and reused when the server answers 304 Not Modified.
+	"""
+	cache = load_json(cache_dir / INDEX_CACHE_FILE) if cache_dir else {}
+	headers = {}
+	if cache.get("url") == BASE_URL and "links" in cache:
+		if cache.get("etag"):
+			headers["If-None-Match"] = cache["etag"]
+		if cache.get("last_modified"):
+			headers["If-Modified-Since"] = cache["last_modified"]
+	async with session.get(BASE_URL, headers=headers, timeout=aiohttp.ClientTimeout(total=30)) as resp:
+		if resp.status == 304:
+			print("Index page unchanged since the last run; using cached links.")
+			return cache["links"]
+		resp.raise_for_status()
+		body = await resp.read()
+		validators = response_validators(resp.headers)
+	if parse_html:
+		# Only materialize <a href=...> tags; the C-based lxml parser skips everything else
+		only_a = SoupStrainer("a", href=True)
+		soup = BeautifulSoup(body, "lxml", parse_only=only_a)
+		links = [urljoin(BASE_URL, a["href"]) for a in soup.find_all("a") if "export" in a["href"].lower()]
+	else:
+		# The index page is machine-generated, so a single regex scan over the raw bytes
+		# finds the same links without building a DOM.
+		links = [urljoin(BASE_URL, m.decode()) for m in _LINK_RE.findall(body)]
+	if cache_dir and any(validators.values()):
+		save_json(cache_dir / INDEX_CACHE_FILE, dict(validators, url=BASE_URL, links=links))
 	return links
 
 
-def download_file(session, url, dest_dir):
+async def with_retries(what, func, *args):
+	"""Await func(*args), retrying transient HTTP failures with exponential backoff.
+
+	Rate limiting (429/503) is retried too, honouring the server's Retry-After.
+	"""
+	for attempt in range(RETRIES + 1):
+		retry_after = None
+		try:
+			return await func(*args)
+		except aiohttp.ClientResponseError as e:
+			if e.status not in RETRY_STATUSES or attempt == RETRIES:
+				raise
+			reason = f"HTTP {e.status}"
+			retry_after = e.headers.get("Retry-After") if e.headers else None
+		except (aiohttp.ClientConnectionError, aiohttp.ClientPayloadError, asyncio.TimeoutError) as e:
+			if attempt == RETRIES:
+				raise
+			reason = str(e) or type(e).__name__
+		# Jitter keeps downloads that were throttled together from all retrying at once
+		delay = RETRY_BACKOFF * 2 ** attempt * random.uniform(1, 2)
+		if retry_after and retry_after.isdigit():
+			delay = max(delay, int(retry_after))
+		print(f"{what} failed ({reason}); retrying in {delay:.1f}s", file=sys.stderr)
+		await asyncio.sleep(delay)
+
+
+def remove_quietly(path: Path):
+	try:
+		if path.exists():
+			path.unlink()
+	except Exception:
+		# If we can't remove the file, continue and let a later write fail if needed
+		pass
+
+
+async def download_file(session, url, dest_dir, sem, meta, fetched):
+	"""Download url into dest_dir, resuming an interrupted .part file when possible.
+
+	meta holds the ETag/Last-Modified of files processed by earlier runs (see
+	META_FILE); those are revalidated with a conditional GET instead of being
+	downloaded again. The validators of a fresh download go into fetched, and only
+	reach meta once its files are uploaded (see record_uploads). Returns None when
+	the server reports a file in meta as unchanged, since its files are already in
+	GCS.
+	"""
 	local_name = url.split("/")[-1]
 	dest = dest_dir / local_name
-	if dest.exists():
+	cached = meta.get(url)
+	if dest.exists() and not cached:
 		return dest
 	tmp = dest.with_suffix(".part")
-	# If a previous .part exists (from an interrupted download), remove it and start fresh
+	# ETag/Last-Modified of the response the .part was started from; sent as If-Range
+	# so the server only honours the Range if the remote file is still the same.
+	validator_file = tmp.with_name(tmp.name + ".validator")
+
+	existing = tmp.stat().st_size if tmp.exists() else 0
+	validator = validator_file.read_text().strip() if existing and validator_file.exists() else ""
+	headers = {}
+	if existing and validator:
+		headers = {"Range": f"bytes={existing}-", "If-Range": validator}
+	elif cached and not existing:
+		if cached.get("etag"):
+			headers["If-None-Match"] = cached["etag"]
+		if cached.get("last_modified"):
+			headers["If-Modified-Since"] = cached["last_modified"]
+
+	stale = False
+	# The semaphore bounds how many transfers are in flight; the session's connector
+	# keeps the underlying connections alive so later files skip the TCP handshake.
+	async with sem, session.get(url, headers=headers, timeout=DOWNLOAD_TIMEOUT) as r:
+		if r.status == 304:
+			# Not modified since its files were uploaded: nothing left to do, whether or
+			# not --cleanup removed the local copy
+			return None
+		if r.status == 416:
+			if r.headers.get("Content-Range") == f"bytes */{existing}":
+				# The previous run got every byte but stopped before renaming
+				tmp.replace(dest)
+				remove_quietly(validator_file)
+				validators = response_validators(r.headers)
+				if not any(validators.values()):
+					# A 416 seldom carries validators; the ones the .part was started from still apply
+					key = "etag" if validator.startswith('"') else "last_modified"
+					validators[key] = validator
+				fetched[url] = validators
+				return dest
+			# Range not satisfiable: the partial doesn't match the remote file any more
+			stale = True
+		else:
+			r.raise_for_status()
+			resumed = r.status == 206 and r.headers.get("Content-Range", "").startswith(f"bytes {existing}-")
+			if r.status == 206 and not resumed:
+				stale = True
+			else:
+				if resumed:
+					print(f"Resuming {local_name} at byte {existing}")
+					mode = "ab"
+				else:
+					# 200: no usable partial, or the server ignored/failed If-Range; start over
+					mode = "wb"
+					new_validator = r.headers.get("ETag", "")
+					if not new_validator or new_validator.startswith("W/"):
+						# If-Range only accepts strong ETags; fall back to the modification date
+						new_validator = r.headers.get("Last-Modified", "")
+					validator_file.write_text(new_validator)
+				# Bytes already written stay in tmp on any error; they are a valid prefix
+				# of the file, so the next run continues from where this one stopped.
+				fh = await asyncio.to_thread(open, tmp, mode, CHUNK_SIZE)
+				try:
+					async for chunk in r.content.iter_chunked(CHUNK_SIZE):
+						await asyncio.to_thread(fh.write, chunk)
+				finally:
+					await asyncio.to_thread(fh.close)
+				tmp.replace(dest)
+				remove_quietly(validator_file)
+				validators = response_validators(r.headers)
+				if any(validators.values()):
+					fetched[url] = validators
+	if stale:
+		remove_quietly(tmp)
+		remove_quietly(validator_file)
+		return await download_file(session, url, dest_dir, sem, meta, fetched)
+	return dest
+
+
+def csv_members(zf):
+	return [m for m in zf.namelist() if m.lower().endswith('.csv')]
+
+
+def list_csv_members(zip_path: Path):
+	with zipfile.ZipFile(zip_path, 'r') as zf:
+		return csv_members(zf)
+
+
+def fast_extract_commands(zip_path: str, member: str):
+	"""Return the external commands that can write member's bytes to stdout, best first.
+
+	pigz inflates single-entry deflated zips with separate read/write/check threads;
+	`unzip -p` handles any archive. Both decompress in C without Python in the loop.
+	"""
+	cmds = []
+	if shutil.which("pigz"):
+		with zipfile.ZipFile(zip_path, 'r') as zf:
+			infos = zf.infolist()
+		# pigz only understands deflated entries
+		if len(infos) == 1 and infos[0].compress_type == zipfile.ZIP_DEFLATED:
+			cmds.append(["pigz", "-dc", zip_path])
+	if shutil.which("unzip"):
+		cmds.append(["unzip", "-p", zip_path, member])
+	return cmds
+
+
+def _extract_member(zip_path: str, member: str, out_dir: str, fast: bool = False):
+	"""Extract one member flat into out_dir; runs in a worker process.
+
+	Each call opens its own ZipFile, since a ZipFile can't be shared across processes.
+	With fast=True, pigz or unzip does the decompression when either is installed;
+	if a tool fails, the next one (and finally zipfile) is tried.
+	"""
+	# Normalize path to basename to avoid nested paths inside zips
+	target_path = Path(out_dir) / Path(member).name
+	print(f"Extracting {member} -> {target_path}")
+	for cmd in fast_extract_commands(zip_path, member) if fast else []:
+		try:
+			with open(target_path, 'wb', buffering=CHUNK_SIZE) as dst:
+				subprocess.run(cmd, stdout=dst, check=True)
+			return target_path
+		except (OSError, subprocess.CalledProcessError) as e:
+			print(f"{cmd[0]} failed for {member} ({e}); trying the next extractor", file=sys.stderr)
+	with open(target_path, 'wb', buffering=CHUNK_SIZE) as dst:
+		with zipfile.ZipFile(zip_path, 'r') as zf, zf.open(member) as src:
+			shutil.copyfileobj(src, dst, CHUNK_SIZE)
+	return target_path
+
+
+async def extract_csvs(zip_path: Path, out_dir: Path, pool, fast: bool = False):
+	"""Extract CSV members of zip_path flat into out_dir and return the written paths.
+
+	Inflating is CPU-bound, so members are decompressed in parallel on pool's processes.
+	"""
+	members = await asyncio.to_thread(list_csv_members, zip_path)
+	if not members:
+		print(f"No CSV files found in {zip_path}")
+	loop = asyncio.get_running_loop()
+	return await asyncio.gather(*[loop.run_in_executor(pool, _extract_member, str(zip_path), m, str(out_dir), fast) for m in members])
+
+
+def split_gcs_url(url: str):
+	"""Split gs://bucket/some/prefix/ into ("bucket", "some/prefix/")."""
+	path = url[len("gs://"):] if url.startswith("gs://") else url
+	bucket_name, _, prefix = path.partition('/')
+	return bucket_name, prefix
+
+
+def open_gcs_bucket(dest_dir: str):
+	"""Return a google-cloud-storage Bucket for dest_dir, or None if the client is unavailable."""
 	try:
-		if tmp.exists():
-			tmp.unlink()
-	except Exception:
-		# If we can't remove the temp file, continue and let the write fail if needed
-		pass
+		from google.cloud import storage
+	except ImportError:
+		print("Error: 'google-cloud-storage' is not installed. Run `pip install google-cloud-storage`, or drop --stream-upload and use a CLI --uploader.", file=sys.stderr)
+		return None
+	bucket_name, _ = split_gcs_url(dest_dir)
+	return storage.Client().bucket(bucket_name)
+
+
+def stream_zip_to_gcs(zip_path: Path, bucket, dest_dir: str, dry_run: bool = False, remote=None):
+	"""Upload CSV members of zip_path straight to GCS without extracting them to disk.
 
-	with session.get(url, stream=True, timeout=60) as r:
+	Each member is decompressed while it is being uploaded, so the CSV is never
+	written out and read back. Members already in remote (see fetch_remote_index)
+	with the same size are skipped. Returns the uploaded object names.
+
+	checksum="crc32c" sends the data's CRC32C along: GCS rejects a corrupted
+	single-request upload, and for resumable ones the client checks the CRC32C
+	GCS reports and deletes a mismatched object.
+	"""
+	_, prefix = split_gcs_url(dest_dir)
+	uploaded = []
+	with zipfile.ZipFile(zip_path, 'r') as zf:
+		members = csv_members(zf)
+		if not members:
+			print(f"No CSV files found in {zip_path}")
+		for member in members:
+			# Normalize path to basename to avoid nested paths inside zips
+			blob_name = prefix + Path(member).name
+			if remote and remote.get(dest_dir + Path(member).name) == zf.getinfo(member).file_size:
+				print(f"Already in GCS, skipping: {dest_dir}{Path(member).name}")
+				continue
+			print(f"Streaming {member} -> {dest_dir}{Path(member).name}")
+			if dry_run:
+				continue
+			blob = bucket.blob(blob_name)
+			with zf.open(member) as src:
+				# Passing the known size lets the client pick a single-request upload for small members
+				blob.upload_from_file(src, rewind=False, size=zf.getinfo(member).file_size, content_type='text/csv', checksum="crc32c")
+			uploaded.append(blob_name)
+	return uploaded
+
+
+async def stream_url_to_gcs(session, url, sem, bucket, dest_dir: str, remote=None):
+	"""Upload url's response body straight to GCS without touching local disk.
+
+	Chunks go from the HTTP response into a resumable upload as they arrive. If the
+	transfer fails the upload is never finalized, so no truncated object is left;
+	the CRC32C is checked as in stream_zip_to_gcs.
+	"""
+	name = url.split("/")[-1]
+	_, prefix = split_gcs_url(dest_dir)
+	async with sem, session.get(url, timeout=DOWNLOAD_TIMEOUT) as r:
 		r.raise_for_status()
-		try:
-			with open(tmp, "wb") as fh:
-				shutil.copyfileobj(r.raw, fh)
-			tmp.rename(dest)
-		except Exception:
-			# On any error while writing, ensure tmp is removed so future runs start clean
-			try:
-				if tmp.exists():
-					tmp.unlink()
-			except Exception:
-				pass
-			raise
-	return dest
+		if remote and r.content_length is not None and remote.get(dest_dir + name) == r.content_length:
+			print(f"Already in GCS, skipping: {dest_dir}{name}")
+			return
+		blob = bucket.blob(prefix + name)
+		writer = await asyncio.to_thread(blob.open, "wb", content_type=r.headers.get("Content-Type", "application/octet-stream"), checksum="crc32c")
+		async for chunk in r.content.iter_chunked(CHUNK_SIZE):
+			await asyncio.to_thread(writer.write, chunk)
+		await asyncio.to_thread(writer.close)
 
 
-def gsutil_cp(local_path: Path, bucket: str, dest_prefix: str, dry_run: bool = False):
+def gcs_dest(bucket: str, dest_prefix: str):
+	"""Return the gs:// folder (with trailing slash) that uploads are copied into."""
 	bucket = bucket.rstrip('/')
 	prefix = dest_prefix or ""
 	if prefix and not prefix.endswith('/'):
 		prefix = prefix + '/'
-	dest_name = f"{bucket}/{prefix}{local_path.name}"
-	# If local_path is a directory, upload recursively with -r
-	if local_path.is_dir():
-		cmd = ["gsutil", "cp", "-r", str(local_path), dest_name]
+	return f"{bucket}/{prefix}"
+
+
+def gsutil_cp(local_paths, bucket: str, dest_prefix: str, dry_run: bool = False, threads: int = 8, processes: int = 4, tool: str = "gsutil", quiet: bool = False):
+	"""Upload local_paths to bucket/dest_prefix with a single `gsutil -m cp` call.
+
+	One invocation amortizes gsutil's startup and auth overhead over the whole
+	batch, and -m lets it transfer the files in parallel. threads/processes override
+	gsutil's conservative boto defaults so large objects are moved as several
+	concurrent slices. With tool="gcloud" the batch goes through `gcloud storage cp`
+	instead, which tunes its own parallelism and uses multipart uploads.
+
+	The CLI writes straight to this process's stdout/stderr instead of being
+	captured; quiet=True silences its progress output but keeps errors.
+	"""
+	# A trailing slash makes gsutil treat the destination as a folder, so every
+	# source keeps its own name regardless of how many are passed.
+	dest_name = gcs_dest(bucket, dest_prefix)
+	if tool == "gcloud":
+		# gcloud storage auto-tunes transfers; the gsutil -m/-o overrides don't apply
+		cmd = ["gcloud", "storage", "cp"]
+		if quiet:
+			cmd.append("--verbosity=error")
 	else:
-		cmd = ["gsutil", "cp", str(local_path), dest_name]
+		cmd = ["gsutil"]
+		if quiet:
+			cmd.append("-q")
+		cmd += [
+			"-m",
+			"-o", f"GSUtil:parallel_thread_count={threads}",
+			"-o", f"GSUtil:parallel_process_count={processes}",
+			"-o", f"GSUtil:sliced_object_download_max_components={threads}",
+			# Only files above the threshold are uploaded as parallel composite objects
+			"-o", f"GSUtil:parallel_composite_upload_threshold={COMPOSITE_UPLOAD_THRESHOLD}",
+			"cp",
+		]
+	# If any path is a directory, upload recursively with -r
+	if any(p.is_dir() for p in local_paths):
+		cmd.append("-r")
+	cmd += [str(p) for p in local_paths]
+	cmd.append(dest_name)
 	print("RUN:", " ".join(cmd))
 	if dry_run:
 		return 0
-	# Make sure gsutil is available on PATH before attempting to run it.
-	if shutil.which("gsutil") is None:
-		print("Error: 'gsutil' not found on PATH. Please install the Google Cloud SDK or ensure 'gsutil' is available.", file=sys.stderr)
+	# Make sure the CLI is available on PATH before attempting to run it.
+	if shutil.which(cmd[0]) is None:
+		print(f"Error: '{cmd[0]}' not found on PATH. Please install the Google Cloud SDK or ensure '{cmd[0]}' is available.", file=sys.stderr)
 		return 2
 
 	try:
-		proc = subprocess.run(cmd, capture_output=True, text=True)
+		# Output is passed through as it's produced rather than buffered and decoded
+		# here, which gets expensive for the per-file progress lines of big batches.
+		proc = subprocess.run(cmd, stdout=subprocess.DEVNULL if quiet else None)
 	except FileNotFoundError as e:
 		# This should be rare since we checked shutil.which, but handle it just in case.
-		print(f"Error running gsutil: {e}", file=sys.stderr)
+		print(f"Error running {cmd[0]}: {e}", file=sys.stderr)
 		return 2
+	return proc.returncode
+
 
+def fetch_remote_index(bucket: str, dest_prefix: str, tool: str = "gsutil"):
+	"""Return {gs://url: size} for the objects already under bucket/dest_prefix.
+
+	One listing call up front is far cheaper than uploading files that are already
+	there. Any failure (CLI missing, nothing uploaded yet) yields an empty index.
+	"""
+	dest_dir = gcs_dest(bucket, dest_prefix)
+	cmd = ["gcloud", "storage", "ls", "-l", dest_dir + "*"] if tool == "gcloud" else ["gsutil", "ls", "-l", dest_dir + "*"]
+	if shutil.which(cmd[0]) is None:
+		return {}
+	try:
+		proc = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+	except OSError:
+		return {}
 	if proc.returncode != 0:
-		if proc.stdout:
-			print(proc.stdout)
-		if proc.stderr:
-			print(proc.stderr, file=sys.stderr)
-	return proc.returncode
+		return {}
+	remote = {}
+	# Rows look like "   <size>  <timestamp>  gs://bucket/name"; the TOTAL line doesn't parse
+	for line in proc.stdout.splitlines():
+		parts = line.split(None, 2)
+		if len(parts) == 3 and parts[0].isdigit() and parts[2].startswith("gs://"):
+			remote[parts[2]] = int(parts[0])
+	return remote
+
+
+def transfer_manager_cp(local_paths, bucket: str, dest_prefix: str, dry_run: bool = False):
+	"""Upload local_paths one by one with google-cloud-storage's transfer_manager.
+
+	upload_chunks_concurrently sends each file as a parallel XML multipart upload,
+	reading the chunks straight from the local file.
+	"""
+	dest_dir = gcs_dest(bucket, dest_prefix)
+	_, prefix = split_gcs_url(dest_dir)
+	if not dry_run:
+		gcs_bucket = open_gcs_bucket(dest_dir)
+		if gcs_bucket is None:
+			return 2
+		from google.cloud.storage import transfer_manager
+
+	rc = 0
+	for local_path in local_paths:
+		print("UPLOAD:", local_path, "->", dest_dir + local_path.name)
+		if dry_run:
+			continue
+		try:
+			transfer_manager.upload_chunks_concurrently(str(local_path), gcs_bucket.blob(prefix + local_path.name))
+		except Exception as e:
+			print(f"transfer_manager upload failed for {local_path}: {e}", file=sys.stderr)
+			rc = 1
+	return rc
+
+
+def upload_files(local_paths, args):
+	"""Upload one batch with the uploader selected by --uploader."""
+	if args.uploader == "transfer_manager":
+		return transfer_manager_cp(local_paths, args.bucket, args.dest_prefix, dry_run=args.dry_run)
+	return gsutil_cp(local_paths, args.bucket, args.dest_prefix, dry_run=args.dry_run, threads=args.threads, processes=args.processes, tool=args.uploader, quiet=args.quiet)
+
+
+def positive_int(value):
+	"""argparse type for counts that must be at least 1."""
+	try:
+		n = int(value)
+	except ValueError:
+		raise argparse.ArgumentTypeError(f"invalid int value: {value!r}")
+	if n < 1:
+		raise argparse.ArgumentTypeError(f"must be at least 1, got {n}")
+	return n
 
 
 def parse_args():
@@ -112,83 +520,254 @@ def parse_args():
 	p.add_argument("--cleanup", action="store_true", help="Remove zip file after successful extraction and upload")
 	p.add_argument("--max-items", type=int, default=0, help="Limit number of files to process (0 = no limit)")
 	p.add_argument("--start-after", default=default_start_after, help="Filename (e.g. 20241203.export.CSV.zip). Skip links up to and including this file and start after it.")
+	p.add_argument("--concurrency", type=positive_int, default=CONCURRENCY, help="Number of downloads in flight at once")
+	p.add_argument("--workers", type=positive_int, default=CONCURRENCY, help="Worker threads for blocking work: disk writes, zip extraction and uploads")
+	p.add_argument("--parse-html", action="store_true", help="Find links with BeautifulSoup/lxml instead of the default regex scan (slower, tolerates unusual markup)")
+	p.add_argument("--quiet", action="store_true", help="Hide gsutil/gcloud progress output (errors are still shown)")
+	p.add_argument("--threads", type=int, default=8, help="gsutil parallel_thread_count (threads per process and slices per object)")
+	p.add_argument("--processes", type=int, default=4, help="gsutil parallel_process_count")
+	p.add_argument("--stream-upload", action="store_true", help="Upload with google-cloud-storage without staging on disk: CSVs stream out of downloaded zips, other files stream straight from HTTP")
+	p.add_argument("--fast-extract", action="store_true", help="Decompress with pigz or `unzip -p` when available instead of Python's zipfile")
+	p.add_argument("--uploader", choices=["gsutil", "gcloud", "transfer_manager"], default="gsutil", help="Upload with `gsutil -m cp`, `gcloud storage cp` (auto-tuned), or google-cloud-storage's transfer_manager (parallel multipart)")
 	return p.parse_args()
 
 
-def main():
-	args = parse_args()
-	downloads = Path(args.downloads_dir).resolve()
-	downloads.mkdir(parents=True, exist_ok=True)
+def select_links(links, start_after, max_items):
+	"""Apply --start-after and --max-items to the scraped link list."""
+	if start_after:
+		names = [url.split('/')[-1] for url in links]
+		if start_after not in names:
+			# Nothing to process until the start-after file shows up on the page
+			return []
+		# skip the file that matches start-after, start from next
+		links = links[names.index(start_after) + 1:]
+	if max_items and max_items > 0:
+		links = links[:max_items]
+	return links
 
-	session = requests.Session()
-	links = list_export_links(session)
-	if not links:
-		print("No export links found on page.")
-		return 0
 
-	print(f"Found {len(links)} links containing 'export'.")
-	processed = 0
-	started = True if not args.start_after else False
-	try:
-		for url in links:
-			# If start-after is provided, skip links until we find that filename
-			if not started:
-				if url.split('/')[-1] == args.start_after:
-					started = True
-					# skip the file that matches start-after, start from next
-					continue
-				else:
-					# still skipping
-					continue
-			if args.max_items and args.max_items > 0 and processed >= args.max_items:
-				break
+async def unpack(local, downloads, args, extract_pool, gcs_bucket=None, remote=None):
+	"""Return the files to upload for a downloaded file, extracting it if it's a zip."""
+	# If the downloaded file is a zip archive, its extracted CSVs are uploaded instead
+	if local.suffix.lower() != '.zip':
+		return [local]
+	if args.stream_upload:
+		await asyncio.to_thread(stream_zip_to_gcs, local, gcs_bucket, gcs_dest(args.bucket, args.dest_prefix), args.dry_run, remote)
+		# Members are already in GCS; only the zip itself is left for --cleanup
+		return []
+	# Extract CSV files directly into downloads/ (flat), not per-archive folders.
+	# Upload only the CSV files extracted from this archive; other archives are
+	# extracting into the same directory concurrently.
+	return await extract_csvs(local, downloads, extract_pool, args.fast_extract)
+
+
+async def download_stage(session, urls, downloads, sem, meta, fetched, extract_q, args, gcs_bucket=None, remote=None):
+	"""Download URLs from the shared urls iterator and queue them for extraction.
+
+	With --stream-upload, non-zip files skip local disk and go straight to GCS.
+	"""
+	for url in urls:
+		if args.stream_upload and not url.lower().endswith(".zip"):
+			dest_dir = gcs_dest(args.bucket, args.dest_prefix)
+			print(f"Streaming {url} -> {dest_dir}{url.split('/')[-1]}")
+			if args.dry_run:
+				continue
 			try:
-				print("Downloading:", url)
-				local = download_file(session, url, downloads)
-				print("Saved:", local)
-				# If the downloaded file is a zip archive, extract into a folder
-				if local.suffix.lower() == '.zip':
-					# Extract CSV files directly into downloads/ (flat), not per-archive folders
-					try:
-						with zipfile.ZipFile(local, 'r') as zf:
-							members = [m for m in zf.namelist() if m.lower().endswith('.csv')]
-							if not members:
-								print(f"No CSV files found in {local}")
-							for member in members:
-								# Normalize path to basename to avoid nested paths inside zips
-								target_name = Path(member).name
-								target_path = downloads / target_name
-								print(f"Extracting {member} -> {target_path}")
-								with zf.open(member) as src, open(target_path, 'wb') as dst:
-									shutil.copyfileobj(src, dst)
-					except zipfile.BadZipFile as e:
-						print(f"Bad zip file {local}: {e}", file=sys.stderr)
-						continue
-					# Upload extracted CSV files individually
-					for csvfile in downloads.glob('*.csv'):
-						rc = gsutil_cp(csvfile, args.bucket, args.dest_prefix, dry_run=args.dry_run)
-						if rc != 0:
-							print(f"gsutil failed for {csvfile} (rc={rc})", file=sys.stderr)
-					# Optionally remove the zip file after successful extraction/upload
-					if args.cleanup:
-						try:
-							local.unlink()
-						except Exception as e:
-							print(f"Failed to remove {local}: {e}", file=sys.stderr)
-				else:
-					rc = gsutil_cp(local, args.bucket, args.dest_prefix, dry_run=args.dry_run)
-					if rc != 0:
-						print(f"gsutil failed for {local} (rc={rc})", file=sys.stderr)
-				processed += 1
+				await with_retries(url, stream_url_to_gcs, session, url, sem, gcs_bucket, dest_dir, remote)
 			except Exception as e:
 				print(f"Error processing {url}: {e}", file=sys.stderr)
-				# continue to next link
+			continue
+		try:
+			print("Downloading:", url)
+			# Retries pick up the .part left by the failed attempt and resume it
+			local = await with_retries(url, download_file, session, url, downloads, sem, meta, fetched)
+		except Exception as e:
+			print(f"Error processing {url}: {e}", file=sys.stderr)
+			continue
+		if local is None:
+			print("Unchanged since it was last processed, skipping:", url)
+			continue
+		print("Saved:", local)
+		await extract_q.put((url, local))
+
+
+async def extract_stage(extract_q, upload_q, downloads, args, extract_pool, gcs_bucket=None, remote=None):
+	"""Unpack downloaded files until a None sentinel arrives, queueing them for upload."""
+	while (item := await extract_q.get()) is not None:
+		url, local = item
+		try:
+			files = await unpack(local, downloads, args, extract_pool, gcs_bucket, remote)
+		except zipfile.BadZipFile as e:
+			print(f"Bad zip file {local}: {e}", file=sys.stderr)
+			continue
+		except Exception as e:
+			print(f"Error processing {local}: {e}", file=sys.stderr)
+			continue
+		await upload_q.put((url, local, files))
+
+
+def upload_batches(results, args, remote=None):
+	"""Upload the files of the collected (url, local, files) items in batches.
+
+	Files already in remote (see fetch_remote_index) with the same size are skipped.
+	Returns the set of files whose upload failed.
+	"""
+	dest_dir = gcs_dest(args.bucket, args.dest_prefix)
+	to_upload = []
+	for _, _, files in results:
+		for p in files:
+			if remote and p.is_file() and remote.get(dest_dir + p.name) == p.stat().st_size:
+				print(f"Already in GCS, skipping: {dest_dir}{p.name}")
 				continue
+			to_upload.append(p)
+	failed = set()
+	for i in range(0, len(to_upload), UPLOAD_BATCH_SIZE):
+		batch = to_upload[i:i + UPLOAD_BATCH_SIZE]
+		rc = upload_files(batch, args)
+		if rc != 0:
+			print(f"{args.uploader} failed for {len(batch)} file(s) starting at {batch[0]} (rc={rc})", file=sys.stderr)
+			failed.update(batch)
+	return failed
+
+
+def record_uploads(results, failed, args, downloads, meta, fetched):
+	"""Commit the items whose files are all in GCS.
+
+	Their validators move from fetched into meta (saved to META_FILE) and, with
+	--cleanup, their zips are removed. Dry runs do neither, since nothing was
+	actually uploaded.
+	"""
+	if args.dry_run:
+		return
+	committed = False
+	for url, local, files in results:
+		if failed.intersection(files):
+			continue
+		# Only now does a later 304 for this URL mean "already handled"
+		if url in fetched:
+			meta[url] = fetched.pop(url)
+			committed = True
+		# Optionally remove zip files whose extracted CSVs all uploaded successfully
+		if args.cleanup and local.suffix.lower() == '.zip':
+			try:
+				local.unlink()
+			except Exception as e:
+				print(f"Failed to remove {local}: {e}", file=sys.stderr)
+	if committed:
+		save_json(downloads / META_FILE, meta)
+
+
+async def upload_stage(upload_q, args, downloads, meta, fetched, remote=None):
+	"""Collect (url, local, files) items until a None sentinel and upload them in batches.
+
+	A batch is sent once it holds UPLOAD_BATCH_SIZE files or its first item has
+	waited UPLOAD_MAX_WAIT seconds. Batches upload in the background, at most
+	UPLOADS_IN_FLIGHT at a time, so the queue keeps draining meanwhile. When every
+	slot is busy the stage stops taking items, which holds back extraction and
+	downloads instead of piling more files up on disk.
+	"""
+	loop = asyncio.get_running_loop()
+	slots = asyncio.Semaphore(UPLOADS_IN_FLIGHT)
+	uploads = set()
+
+	async def send(items):
+		try:
+			failed = await asyncio.to_thread(upload_batches, items, args, remote)
+			# Recorded on the event loop, so concurrent batches never update meta at once
+			record_uploads(items, failed, args, downloads, meta, fetched)
+		except Exception as e:
+			print(f"Upload failed: {e}", file=sys.stderr)
+		finally:
+			slots.release()
+
+	pending = []
+	# Running count of files in pending, so each new item doesn't rescan the batch
+	pending_files = 0
+	deadline = None
+	done = False
+	while not done:
+		try:
+			timeout = None if deadline is None else max(deadline - loop.time(), 0)
+			item = await asyncio.wait_for(upload_q.get(), timeout)
+		except asyncio.TimeoutError:
+			pass
+		else:
+			if item is None:
+				done = True
+			else:
+				if not pending:
+					deadline = loop.time() + UPLOAD_MAX_WAIT
+				pending.append(item)
+				pending_files += len(item[2])
+		if pending and (done or pending_files >= UPLOAD_BATCH_SIZE or loop.time() >= deadline):
+			await slots.acquire()
+			task = asyncio.create_task(send(pending))
+			uploads.add(task)
+			task.add_done_callback(uploads.discard)
+			pending = []
+			pending_files = 0
+			deadline = None
+	await asyncio.gather(*uploads)
+
+
+async def run(args, downloads):
+	# asyncio.to_thread() runs the blocking work (file writes, zip extraction, uploads)
+	# on the loop's default executor; size it from --workers.
+	asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=args.workers))
+	gcs_bucket = None
+	if args.stream_upload and not args.dry_run:
+		gcs_bucket = open_gcs_bucket(gcs_dest(args.bucket, args.dest_prefix))
+		if gcs_bucket is None:
+			return 2
+	# One pooled connection per in-flight download, kept alive between files so each
+	# new download reuses an open connection instead of reconnecting.
+	connector = aiohttp.TCPConnector(limit=args.concurrency, limit_per_host=args.concurrency, keepalive_timeout=KEEPALIVE_TIMEOUT, ttl_dns_cache=300)
+	async with aiohttp.ClientSession(connector=connector) as session:
+		links = await with_retries(BASE_URL, list_export_links, session, args.parse_html, downloads)
+		if not links:
+			print("No export links found on page.")
+			return 0
+
+		print(f"Found {len(links)} links containing 'export'.")
+		links = select_links(links, args.start_after, args.max_items)
+		sem = asyncio.Semaphore(args.concurrency)
+		meta = load_json(downloads / META_FILE)
+		fetched = {}
+		# Download -> extract -> upload run as separate stages joined by bounded queues,
+		# so network-in, CPU/disk and network-out work overlap. The small queues make
+		# fast stages wait for slow ones instead of piling files up on disk: at most
+		# UPLOADS_IN_FLIGHT batches plus one pending batch of extracted files wait for
+		# upload, besides what sits in the queues.
+		urls = iter(links)
+		extract_q = asyncio.Queue(maxsize=QUEUE_SIZE)
+		upload_q = asyncio.Queue(maxsize=QUEUE_SIZE)
+		remote = {} if args.dry_run else await asyncio.to_thread(fetch_remote_index, args.bucket, args.dest_prefix, args.uploader)
+		with ProcessPoolExecutor() as extract_pool:
+			uploader = asyncio.create_task(upload_stage(upload_q, args, downloads, meta, fetched, remote))
+			extractors = [
+				asyncio.create_task(extract_stage(extract_q, upload_q, downloads, args, extract_pool, gcs_bucket, remote))
+				for _ in range(os.cpu_count() or 1)
+			]
+			await asyncio.gather(*[download_stage(session, urls, downloads, sem, meta, fetched, extract_q, args, gcs_bucket, remote) for _ in range(args.concurrency)])
+			for _ in extractors:
+				await extract_q.put(None)
+			await asyncio.gather(*extractors)
+			await upload_q.put(None)
+			await uploader
+	return 0
+
+
+def main():
+	args = parse_args()
+	downloads = Path(args.downloads_dir).resolve()
+	downloads.mkdir(parents=True, exist_ok=True)
+
+	try:
+		return asyncio.run(run(args, downloads))
 	except KeyboardInterrupt:
 		print("\nInterrupted by user. Exiting cleanly.")
 		# exit, leaving completed downloads and removing any in-progress .part files will be handled on next run
-
-	return 0
+		return 0
 
 
 if __name__ == "__main__":
@@ -0,0 +1,139 @@
+"""Tests for download_file's resume logic against a local aiohttp static server."""
+import asyncio
+import contextlib
+
+from aiohttp import web
+import aiohttp
+import pytest
+
+import main
+
+CONTENT = b"0123456789" * 100
+NAME = "20241208.export.CSV.zip"
+# Older than any file the test writes, so an If-Range with this date never matches
+OLD_DATE = "Thu, 01 Jan 2015 00:00:00 GMT"
+
+
+@contextlib.asynccontextmanager
+async def serve(root, seen):
+	"""Serve root over HTTP on a free port, appending each request's headers to seen."""
+	@web.middleware
+	async def record(request, handler):
+		seen.append(dict(request.headers))
+		return await handler(request)
+
+	app = web.Application(middlewares=[record])
+	app.router.add_static("/", root)
+	runner = web.AppRunner(app)
+	await runner.setup()
+	site = web.TCPSite(runner, "127.0.0.1", 0)
+	await site.start()
+	port = site._server.sockets[0].getsockname()[1]
+	try:
+		yield f"http://127.0.0.1:{port}/{NAME}"
+	finally:
+		await runner.cleanup()
+
+
+@pytest.fixture
+def dirs(tmp_path):
+	site = tmp_path / "site"
+	downloads = tmp_path / "downloads"
+	site.mkdir()
+	downloads.mkdir()
+	(site / NAME).write_bytes(CONTENT)
+	return site, downloads
+
+
+def download(site, downloads, recorded=False, part=None, validator=None):
+	"""Run download_file once; returns (path, fetched, request headers, etag).
+
+	recorded=True puts the file's current ETag into meta, as if an earlier run had
+	uploaded it.
+	"""
+	seen = []
+	fetched = {}
+
+	async def go():
+		async with serve(site, seen) as url, aiohttp.ClientSession() as session:
+			async with session.head(url) as r:
+				etag = r.headers["ETag"]
+			seen.clear()
+			tmp = (downloads / NAME).with_suffix(".part")
+			if part is not None:
+				tmp.write_bytes(part)
+			if validator is not None:
+				tmp.with_name(tmp.name + ".validator").write_text(etag if validator == "etag" else validator)
+			meta = {url: {"etag": etag, "last_modified": None}} if recorded else {}
+			path = await main.download_file(session, url, downloads, asyncio.Semaphore(1), meta, fetched)
+			return path, etag, url
+
+	path, etag, url = asyncio.run(go())
+	return path, fetched.get(url), seen, etag
+
+
+def leftovers(downloads):
+	return sorted(p.name for p in downloads.iterdir() if p.name != NAME)
+
+
+def test_fresh_download_records_validators(dirs):
+	site, downloads = dirs
+	path, validators, seen, etag = download(site, downloads)
+	assert path.read_bytes() == CONTENT
+	assert validators["etag"] == etag
+	assert "Range" not in seen[0]
+	assert leftovers(downloads) == []
+
+
+def test_resumes_partial_download(dirs):
+	site, downloads = dirs
+	path, validators, seen, etag = download(site, downloads, part=CONTENT[:300], validator="etag")
+	assert path.read_bytes() == CONTENT
+	assert seen[0]["Range"] == "bytes=300-"
+	assert seen[0]["If-Range"] == etag
+	assert validators["etag"] == etag
+	assert leftovers(downloads) == []
+
+
+def test_changed_remote_file_restarts_download(dirs):
+	site, downloads = dirs
+	# The server ignores the Range because the file changed after OLD_DATE and sends it whole
+	path, validators, seen, etag = download(site, downloads, part=b"x" * 300, validator=OLD_DATE)
+	assert path.read_bytes() == CONTENT
+	assert seen[0]["If-Range"] == OLD_DATE
+	assert validators["etag"] == etag
+	assert leftovers(downloads) == []
+
+
+def test_complete_partial_is_renamed_and_recorded(dirs):
+	site, downloads = dirs
+	path, validators, seen, etag = download(site, downloads, part=CONTENT, validator="etag")
+	assert path.read_bytes() == CONTENT
+	# A single request that got 416 "bytes */1000"; nothing was downloaded again
+	assert len(seen) == 1
+	assert validators == {"etag": etag, "last_modified": None}
+	assert leftovers(downloads) == []
+
+
+def test_partial_longer_than_remote_file_restarts(dirs):
+	site, downloads = dirs
+	path, validators, seen, etag = download(site, downloads, part=CONTENT + b"extra", validator="etag")
+	assert path.read_bytes() == CONTENT
+	# 416 for the stale partial, then a plain GET for the whole file
+	assert len(seen) == 2
+	assert "Range" not in seen[1]
+	assert validators["etag"] == etag
+	assert leftovers(downloads) == []
+
+
+@pytest.mark.parametrize("local_copy", [True, False])
+def test_unchanged_recorded_file_is_skipped(dirs, local_copy):
+	site, downloads = dirs
+	if local_copy:
+		(downloads / NAME).write_bytes(b"old copy")
+	path, validators, seen, etag = download(site, downloads, recorded=True)
+	assert path is None
+	assert seen[0]["If-None-Match"] == etag
+	assert validators is None
+	if local_copy:
+		assert (downloads / NAME).read_bytes() == b"old copy"